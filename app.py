@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
 import datetime
+import tempfile
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 import my_tools as mt
 import yfinance as yf  # Ensure yfinance is imported
 
@@ -29,9 +33,134 @@ if "selected_windows" not in st.session_state:
 if "created_smas" not in st.session_state:
     st.session_state["created_smas"] = []
 
+if "screener_results" not in st.session_state:
+    st.session_state["screener_results"] = None
+
+if "optimizer_results" not in st.session_state:
+    st.session_state["optimizer_results"] = None
+
+if "jobs" not in st.session_state:
+    st.session_state["jobs"] = {}
+
+# Maximum number of unfinished background jobs per user
+MAX_JOBS_PER_USER = 2
+
+# Larger strategy searches always run as background jobs so they don't freeze the UI
+MAX_FOREGROUND_CANDIDATES = 150
+
+# Process pool, manager and progress dict shared by all sessions of the app
+@st.cache_resource
+def get_job_resources():
+    manager = multiprocessing.Manager()
+    return ProcessPoolExecutor(), manager, manager.dict()
+
+# Background jobs with their progress, refreshed every few seconds
+@st.fragment(run_every=2)
+def show_jobs():
+    if not st.session_state["jobs"]:
+        return
+    executor, manager, progress = get_job_resources()
+
+    st.markdown("### Background Jobs")
+    for job_id, job in list(st.session_state["jobs"].items()):
+        status, fraction = mt.job_status(job, progress, job_id)
+
+        # Hand finished results over to the views that use them
+        if status == "done" and not job["handed_off"]:
+            job["handed_off"] = True
+            if job.get("result_key"):
+                st.session_state[job["result_key"]] = job["future"].result()
+                st.rerun()
+
+        col1, col2, col3 = st.columns([2, 3, 1])
+        with col1:
+            st.write(f"**{job['name']}** ({job['submitted']:%H:%M:%S}): {status}")
+        with col2:
+            st.progress(fraction)
+        with col3:
+            if status in ("queued", "running"):
+                if st.button("Cancel", key=f"cancel_{job_id}"):
+                    mt.cancel_job(job)
+            elif st.button("Remove", key=f"remove_{job_id}"):
+                del st.session_state["jobs"][job_id]
+                progress.pop(job_id, None)
+                st.rerun()
+        if status == "failed":
+            st.error(f"Job failed: {job['future'].exception()}")
+
+# Submit fn(*args) to the process pool and store its result in st.session_state[result_key] when done
+def start_background_job(name, result_key, fn, *args, **kwargs):
+    executor, manager, progress = get_job_resources()
+    try:
+        job_id = mt.submit_job(st.session_state["jobs"], executor, manager, progress, name, fn, *args, max_running=MAX_JOBS_PER_USER, **kwargs)
+        st.session_state["jobs"][job_id]["result_key"] = result_key
+    except ValueError as e:
+        st.error(str(e))
+
+# Export formats offered to the user, and the file extension and MIME type of each written format
+EXPORT_FORMATS = {"Parquet": "parquet", "Arrow IPC": "arrow", "CSV": "csv"}
+EXPORT_FILE_TYPES = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+    "csv": ("csv", "text/csv")
+}
+
+# Table that only sends the visible page of rows to the browser
+def show_paginated_table(df, key, page_size_options=(25, 50, 100, 250)):
+    index_name = df.index.name or "index"
+    columns = [index_name] + list(df.columns)
+
+    # Sorting and filtering controls, applied server side on the full DataFrame
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col1:
+        sort_by = st.selectbox("Sort by", columns, key=f"{key}_sort_by")
+    with col2:
+        order = st.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order")
+    with col3:
+        filter_column = st.selectbox("Filter column", columns, key=f"{key}_filter_column")
+    with col4:
+        filter_value = st.text_input("Filter value", key=f"{key}_filter_value")
+
+    positions = mt.filter_sort_positions(df, sort_by, order == "Ascending", filter_column, filter_value)
+
+    # Paging controls
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Rows per page", page_size_options, index=1, key=f"{key}_page_size")
+    with col2:
+        page = st.number_input("Page", min_value=1, value=1, step=1, key=f"{key}_page")
+
+    page_df, total_pages, page = mt.paginate_dataframe(df, positions, page, page_size)
+
+    with col3:
+        st.write(f"Page {page} of {total_pages} ({len(positions)} of {len(df)} rows)")
+
+    st.dataframe(page_df)
+
+    # Export the whole filtered view only when asked for
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Export Format", list(EXPORT_FORMATS), key=f"{key}_export_format")
+    if st.button("Prepare Export", key=f"{key}_export"):
+        file_format = EXPORT_FORMATS[export_format]
+        extension, mime = EXPORT_FILE_TYPES[file_format]
+
+        # Write the file chunk by chunk to disk, st.download_button then reads it once
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_path = os.path.join(export_dir, f"{key}.{extension}")
+            mt.export_dataframe(df, export_path, file_format, positions=positions)
+            with open(export_path, "rb") as export_file:
+                st.download_button(
+                    f"Download {extension.upper()}",
+                    data=export_file,
+                    file_name=f"{key}.{extension}",
+                    mime=mime,
+                    key=f"{key}_download"
+                )
+
 # Sidebar for navigation
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Go to VIEW", ["Data",  "SMAs", "Charts", "Trading Strategy", "Analyze Strategy"])
+page = st.sidebar.radio("Go to VIEW", ["Data",  "SMAs", "Charts", "Trading Strategy", "Analyze Strategy", "Correlation Screener"])
 
 # User instructions in the sidebar
 st.sidebar.title("Instructions:")
@@ -156,9 +285,12 @@ elif page == "SMAs":
                 sma_df = mt.create_moving_averages(st.session_state["data"], windows=st.session_state["selected_windows"])
                 st.session_state["created_smas"] = st.session_state["selected_windows"]
                 st.write("SMAs created for the following windows:", st.session_state["selected_windows"])
-                st.dataframe(sma_df)
             else:
                 st.write("No SMA windows selected.")
+
+        # Keep the table on screen so it can be paged, sorted and filtered
+        if st.session_state["created_smas"]:
+            show_paginated_table(st.session_state["data"], key="sma_table")
     else:
         st.write("Please fetch data in the 'Data' view first.")
 
@@ -269,13 +401,128 @@ elif page == "Trading Strategy":
             st.session_state["data"]['Exit_Signal'] = mt.generate_signal(st.session_state["data"], exit_sma1, exit_condition, exit_sma2)
 
             st.success("Strategy created successfully!")
-
-            # Optionally, display the DataFrame with the new signals
-            st.markdown("### Dataframe with Strategy Signals")
-            st.dataframe(st.session_state["data"])
         else:
             st.error("No data available. Please ensure data is loaded first.")
 
+    # Display the DataFrame with the signals once a strategy has been created
+    if st.session_state.get("data") is not None and "Entry_Signal" in st.session_state["data"].columns:
+        st.markdown("### Dataframe with Strategy Signals")
+        show_paginated_table(st.session_state["data"], key="signals_table")
+
+    # Adaptive search over the strategies that can be built from the created SMAs
+    st.header("Optimize Strategy")
+    st.write("Score every strategy on a short, recent slice of the history and only backtest the best ones on the full history.")
+
+    if st.session_state.get("data") is not None and st.session_state["created_smas"]:
+        grid_size = len(mt.strategy_candidates(st.session_state["created_smas"]))
+
+        col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+        with col1:
+            eta = st.selectbox("Keep 1 in", [2, 3, 4], index=1, help="Only this fraction of the strategies is promoted to the next, longer slice of history.")
+        with col2:
+            min_fraction = st.selectbox("First Slice of History", [1/27, 1/9, 1/3], index=1, format_func=lambda value: f"{value:.0%}")
+        with col3:
+            metric = st.selectbox("Maximize", ["Total Profit/Loss (%)", "Total Profit/Loss", "Average Profit/Loss per Trade", "Profitable Trades"])
+        with col4:
+            max_candidates = st.number_input(
+                "Strategies to Search", min_value=1, max_value=grid_size, value=min(grid_size, MAX_FOREGROUND_CANDIDATES), step=10,
+                help=f"The created SMAs give {grid_size} strategies. A random sample of this size is searched."
+            )
+
+        optimize_args = (st.session_state["data"], st.session_state["created_smas"])
+        optimize_kwargs = {"eta": eta, "min_fraction": min_fraction, "metric": metric, "max_candidates": int(max_candidates), "seed": 0}
+        optimize_name = f"Optimize {st.session_state['ticker'].upper()}"
+
+        if max_candidates > MAX_FOREGROUND_CANDIDATES:
+            st.info(f"Searches of more than {MAX_FOREGROUND_CANDIDATES} strategies run in the background.")
+
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            if st.button("Optimize"):
+                if max_candidates > MAX_FOREGROUND_CANDIDATES:
+                    start_background_job(optimize_name, "optimizer_results", mt.successive_halving_search, *optimize_args, **optimize_kwargs)
+                else:
+                    with st.spinner("Searching strategies..."):
+                        st.session_state["optimizer_results"] = mt.successive_halving_search(*optimize_args, **optimize_kwargs)
+        with col2:
+            if st.button("Optimize in Background"):
+                start_background_job(optimize_name, "optimizer_results", mt.successive_halving_search, *optimize_args, **optimize_kwargs)
+
+        show_jobs()
+
+        results = st.session_state["optimizer_results"]
+        if results is not None:
+            best = results["Best Strategy"]
+            column_to_label = {v: k for k, v in label_to_column.items()}
+            column_to_label["Close"] = "Close"
+
+            st.markdown(f"#### Best Strategy ({results['Metric']}: {results['Best Score']:.2f})")
+            st.write(
+                f"BUY when {column_to_label.get(best['entry_sma1'], best['entry_sma1'])} is {best['entry_condition']} {column_to_label.get(best['entry_sma2'], best['entry_sma2'])}, "
+                f"SELL when {column_to_label.get(best['exit_sma1'], best['exit_sma1'])} is {best['exit_condition']} {column_to_label.get(best['exit_sma2'], best['exit_sma2'])}."
+            )
+            st.write(f"**Candidates:** {results['Candidates']} in {results['Rungs']} rounds")
+            st.write(f"**Backtests Run:** {results['Evaluations']} ({results['Full-History Backtests']} on the full history)")
+            st.write(f"**Full-History Backtests Saved:** {results['Full-History Backtests Saved']}")
+            st.write(f"**Compute Saved (%):** {results['Compute Saved (%)']:.1f}")
+
+            # Copy the best strategy into the entry and exit selectboxes above
+            def use_best_strategy():
+                for side in ("entry", "exit"):
+                    st.session_state[f"{side}_sma1"] = column_to_label[best[f"{side}_sma1"]]
+                    st.session_state[f"{side}_condition"] = best[f"{side}_condition"]
+                    st.session_state[f"{side}_sma2"] = column_to_label[best[f"{side}_sma2"]]
+
+            if all(best[field] in column_to_label for field in ("entry_sma1", "entry_sma2", "exit_sma1", "exit_sma2")):
+                st.button("Use Best Strategy", on_click=use_best_strategy)
+
+            st.markdown("### Final Round")
+            st.dataframe(results["Leaderboard"])
+    else:
+        st.write("Please fetch data and create SMAs first.")
+
+# Correlation Screener View
+elif page == "Correlation Screener":
+    st.title("Correlation Screener")
+    st.write("Find the most and least correlated stocks of a universe over a rolling window of daily returns.")
+
+    tickers_text = st.text_area("Ticker Symbols (separated by commas or spaces)", value=st.session_state["ticker"].upper())
+
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col1:
+        screener_start_date = st.date_input("Start Date", value=st.session_state["start_date"], key="screener_start_date")
+    with col2:
+        screener_end_date = st.date_input("End Date", value=st.session_state["end_date"], key="screener_end_date")
+    with col3:
+        window = st.number_input("Rolling Window (days)", min_value=5, value=60, step=5)
+    with col4:
+        top_k = st.number_input("Peers per Symbol", min_value=1, value=10, step=1)
+
+    if st.button("Run Screener"):
+        tickers = sorted(set(text.upper() for text in tickers_text.replace(",", " ").split()))
+        if len(tickers) < 2:
+            st.error("Please enter at least 2 ticker symbols.")
+        else:
+            start_background_job(
+                f"Screen {len(tickers)} tickers", "screener_results",
+                mt.screen_universe, tickers, screener_start_date, screener_end_date, window=int(window), top_k=int(top_k)
+            )
+
+    show_jobs()
+
+    results = st.session_state["screener_results"]
+    if results is not None:
+        st.markdown("### Peers of a Symbol")
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            symbol = st.selectbox("Symbol", results["Symbol"].unique())
+        with col2:
+            direction = st.radio("Show", ["most", "least"], format_func=lambda value: f"{value.capitalize()} correlated", horizontal=True)
+        st.dataframe(mt.top_correlated(results, symbol, direction))
+
+        st.markdown("### All Results")
+        show_paginated_table(results, key="screener_table")
+
 # Analyze Strategy View
 
 # Initialize session state for trades_df
@@ -287,7 +534,25 @@ elif page == "Analyze Strategy":
     st.title("Analyze Strategy")
     st.write("Analyze the performance of your trading strategy.")
 
-    if st.button("Analyze"):
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        analyze = st.button("Analyze")
+    with col2:
+        analyze_in_background = st.button("Run in Background", help="Run the backtest in a background process. The UI stays responsive and the result is loaded here when it finishes.")
+
+    if analyze_in_background:
+        if st.session_state.get("data") is not None and "Entry_Signal" in st.session_state["data"].columns:
+            empty_trades_df = pd.DataFrame(columns=['Entry Date', 'Entry Price', 'Exit Date', 'Exit Price', 'Quantity', 'Profit/Loss', 'Profit/Loss (%)'])
+            start_background_job(
+                f"Backtest {st.session_state['ticker'].upper()}", "trades_df",
+                mt.process_trades, st.session_state["data"], empty_trades_df, 1
+            )
+        else:
+            st.error("No strategy signals available. Please create a strategy first.")
+
+    show_jobs()
+
+    if analyze:
 
         # Reset trades_df before analyzing
         st.session_state["trades_df"] = pd.DataFrame(columns=['Entry Date', 'Entry Price', 'Exit Date', 'Exit Price', 'Quantity', 'Profit/Loss', 'Profit/Loss (%)'])
@@ -296,24 +561,25 @@ elif page == "Analyze Strategy":
         st.session_state["trades_df"] = mt.process_trades(st.session_state["data"], st.session_state["trades_df"], quantity=1)
         st.success("Analysis complete! Trades recorded.")
 
-        # Analyze the trades in trades_df
-        if len(st.session_state["trades_df"]) > 0:
-            metrics = mt.analyze_strategy(st.session_state["trades_df"])
-
-            st.markdown("### Strategy Performance Metrics")
-            st.write(f"**Total Trades:** {metrics['Total Trades']}")
-            st.write(f"**Total Profit/Loss:** {metrics['Total Profit/Loss']}")
-            st.write(f"**Total Profit/Loss (%):** {metrics['Total Profit/Loss (%)']}")
-            st.write(f"**Average Profit/Loss per Trade:** {metrics['Average Profit/Loss per Trade']}")
-            st.write(f"**Maximum Profit:** {metrics['Maximum Profit']}")
-            st.write(f"**Maximum Loss:** {metrics['Maximum Loss']}")
-            st.write(f"**Profitable Trades:** {metrics['Profitable Trades']}")
-            st.write(f"**Total Quantity Traded:** {metrics['Total Quantity Traded']}")
-            st.write(f"**Total Buy Price:** {metrics['Total Buy Price']}")
-            st.write(f"**Total Sale Price:** {metrics['Total Sale Price']}")
-
-
-            st.markdown("### Recorded Trades")
-            st.dataframe(st.session_state["trades_df"])
-        else:
+        if len(st.session_state["trades_df"]) == 0:
             st.warning("No trades recorded yet. Please define and execute a strategy first.")
+
+    # Analyze the trades in trades_df
+    if len(st.session_state["trades_df"]) > 0:
+        metrics = mt.analyze_strategy(st.session_state["trades_df"])
+
+        st.markdown("### Strategy Performance Metrics")
+        st.write(f"**Total Trades:** {metrics['Total Trades']}")
+        st.write(f"**Total Profit/Loss:** {metrics['Total Profit/Loss']}")
+        st.write(f"**Total Profit/Loss (%):** {metrics['Total Profit/Loss (%)']}")
+        st.write(f"**Average Profit/Loss per Trade:** {metrics['Average Profit/Loss per Trade']}")
+        st.write(f"**Maximum Profit:** {metrics['Maximum Profit']}")
+        st.write(f"**Maximum Loss:** {metrics['Maximum Loss']}")
+        st.write(f"**Profitable Trades:** {metrics['Profitable Trades']}")
+        st.write(f"**Total Quantity Traded:** {metrics['Total Quantity Traded']}")
+        st.write(f"**Total Buy Price:** {metrics['Total Buy Price']}")
+        st.write(f"**Total Sale Price:** {metrics['Total Sale Price']}")
+
+
+        st.markdown("### Recorded Trades")
+        show_paginated_table(st.session_state["trades_df"], key="trades_table")
@@ -0,0 +1,326 @@
+"""
+Load test for the stock app that runs offline on synthetic data.
+
+Simulates many analysts using the app at the same time. Every session goes through
+Data -> SMAs -> Charts -> Trading Strategy -> Analyze Strategy with Streamlit's AppTest, which runs
+app.py the same way the server does. yf.download and yf.Ticker are replaced by a local synthetic
+data provider, so no Yahoo endpoint is called.
+
+AppTest keeps global state while a script runs, so concurrent sessions run in separate worker
+processes. A Streamlit server runs all sessions in one process, so the workers are pinned to the
+cores one app instance would get (--cpus, 1 by default for a single GIL-bound instance).
+
+The memory per session is measured separately, in one process like a Streamlit server: after a
+warm-up session, a number of sessions are run and kept alive together, and the growth of the RSS is
+divided by their number. It includes widget state and Streamlit's own per-session objects, not only
+the DataFrames in the session state.
+
+Usage:
+    python load_test.py --sessions 50 --concurrency 10
+"""
+import argparse
+import datetime
+import gc
+import os
+import resource
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+STEPS = ["Data", "SMAs", "Charts", "Trading Strategy", "Analyze Strategy"]
+
+# Session state entries holding DataFrames, reported as the DataFrame bytes of a session
+SESSION_FRAMES = ["data", "trades_df", "screener_results"]
+
+
+def synthetic_stock_data(ticker, start_date, end_date=None):
+    """
+    Generates reproducible daily OHLCV data for a ticker with a geometric random walk over business days.
+
+    :param ticker: str, stock ticker symbol, also used as the random seed
+    :param start_date: str or date, the first date
+    :param end_date: str or date, the last date (default is today's date)
+    :return: pd.DataFrame, DataFrame with the same columns and index as yf.download
+    """
+    if end_date is None:
+        end_date = datetime.date.today()
+    dates = pd.bdate_range(start_date, end_date, inclusive="left", name="Date")
+    rng = np.random.default_rng(zlib.crc32(ticker.upper().encode()))
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+    open_ = close * np.exp(rng.normal(0, 0.005, len(dates)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, len(dates))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, len(dates))))
+
+    return pd.DataFrame({
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Adj Close": close,
+        "Volume": rng.integers(1_000_000, 50_000_000, len(dates))
+    }, index=dates)
+
+
+def synthetic_download(tickers, start=None, end=None, **kwargs):
+    """
+    Drop-in replacement for yf.download: one ticker gives flat columns, a list gives (Price, Ticker) columns.
+    """
+    if isinstance(tickers, str):
+        return synthetic_stock_data(tickers, start, end)
+
+    frames = {ticker: synthetic_stock_data(ticker, start, end) for ticker in tickers}
+    data = pd.concat(frames, axis=1, names=["Ticker", "Price"])
+    return data.swaplevel(axis=1).sort_index(axis=1)
+
+
+class SyntheticTicker:
+    """
+    Drop-in replacement for yf.Ticker with the info fields used by the app.
+    """
+
+    def __init__(self, ticker):
+        rng = np.random.default_rng(zlib.crc32(ticker.upper().encode()))
+        price = round(float(rng.uniform(20, 500)), 2)
+        self.info = {
+            "shortName": f"{ticker.upper()} Synthetic Inc.",
+            "symbol": ticker.upper(),
+            "sector": "Technology",
+            "industry": "Software",
+            "dividendRate": round(float(rng.uniform(0, 3)), 2),
+            "currentPrice": price,
+            "recommendationKey": "buy",
+            "recommendationMean": round(float(rng.uniform(1, 5)), 1),
+            "numberOfAnalystOpinions": int(rng.integers(1, 40)),
+            "targetMeanPrice": round(price * 1.1, 2),
+            "targetHighPrice": round(price * 1.4, 2),
+            "targetLowPrice": round(price * 0.8, 2),
+            "targetMedianPrice": round(price * 1.1, 2)
+        }
+
+
+def install_synthetic_provider():
+    """
+    Replaces yf.download and yf.Ticker with the synthetic provider in the current process.
+    """
+    yf.download = synthetic_download
+    yf.Ticker = SyntheticTicker
+
+
+def _current_rss():
+    """
+    Returns the resident set size of this process in bytes (Linux only).
+    """
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _init_worker(cpus):
+    install_synthetic_provider()
+    if cpus:
+        # Use cores this process is allowed to run on, which need not start at core 0
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:cpus])
+
+    # Import the app and its libraries once, so the first session's latency does not include them
+    AppTest.from_file(APP_PATH, default_timeout=120).run()
+    gc.collect()
+
+
+def _click(at, label):
+    next(button for button in at.button if button.label == label).click()
+
+
+def _check_exception(at, step):
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].message}")
+
+
+def run_session(session_id, start_date, end_date, windows, timeout, keep_alive=None):
+    """
+    Runs one scripted session through all views and times each of them.
+
+    :param keep_alive: list, if given the session's AppTest is appended to it so that its memory is not freed
+    :return: dict, the time of each step in seconds, the number of script runs, the DataFrame bytes in the
+             session state and the peak RSS of the worker, both in bytes
+    """
+    ticker = f"SYN{session_id}"
+    timings = {}
+    runs = 0
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    if keep_alive is not None:
+        keep_alive.append(at)
+
+    def run(step):
+        nonlocal runs
+        at.run()
+        runs += 1
+        _check_exception(at, step)
+
+    started = time.perf_counter()
+    run("Data")
+    at.text_input[0].input(ticker)
+    at.date_input[0].set_value(start_date)
+    at.date_input[1].set_value(end_date)
+    _click(at, "Fetch Data")
+    run("Data")
+    timings["Data"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    at.sidebar.radio[0].set_value("SMAs")
+    run("SMAs")
+    for window in windows:
+        next(checkbox for checkbox in at.checkbox if checkbox.label == f"SMA {window}").check()
+    _click(at, "Create SMA")
+    run("SMAs")
+    timings["SMAs"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    at.sidebar.radio[0].set_value("Charts")
+    run("Charts")
+    timings["Charts"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    at.sidebar.radio[0].set_value("Trading Strategy")
+    run("Trading Strategy")
+    short_label, long_label = f"{min(windows)} Day SMA", f"{max(windows)} Day SMA"
+    at.selectbox(key="entry_sma1").set_value(short_label)
+    at.selectbox(key="entry_condition").set_value("greater than")
+    at.selectbox(key="entry_sma2").set_value(long_label)
+    at.selectbox(key="exit_sma1").set_value(short_label)
+    at.selectbox(key="exit_condition").set_value("less than")
+    at.selectbox(key="exit_sma2").set_value(long_label)
+    _click(at, "Create Strategy")
+    run("Trading Strategy")
+    timings["Trading Strategy"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    at.sidebar.radio[0].set_value("Analyze Strategy")
+    run("Analyze Strategy")
+    _click(at, "Analyze")
+    run("Analyze Strategy")
+    timings["Analyze Strategy"] = time.perf_counter() - started
+
+    frame_bytes = sum(
+        int(at.session_state[key].memory_usage(deep=True).sum())
+        for key in SESSION_FRAMES
+        if key in at.session_state and isinstance(at.session_state[key], pd.DataFrame)
+    )
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 2**10
+    return {"timings": timings, "runs": runs, "frame_bytes": frame_bytes, "peak_rss": peak_rss}
+
+
+def measure_session_memory(sessions, start_date, end_date, windows, timeout):
+    """
+    Runs `sessions` sessions one after another in this process, keeping them all alive, and returns
+    the growth of the RSS divided by their number.
+
+    A full warm-up session runs first so that lazy imports, caches and allocator growth are not
+    charged to the measured sessions.
+
+    :return: float, the memory per session in bytes
+    """
+    run_session("warmup", start_date, end_date, windows, timeout)
+    gc.collect()
+    rss_before = _current_rss()
+
+    alive = []
+    for session_id in range(sessions):
+        run_session(f"mem{session_id}", start_date, end_date, windows, timeout, keep_alive=alive)
+    gc.collect()
+
+    return max(0, _current_rss() - rss_before) / sessions
+
+
+def run_load_test(sessions, concurrency, years, windows, timeout, cpus=1, memory_sessions=10):
+    """
+    Runs `sessions` scripted sessions, `concurrency` at a time, and collects their results. Then measures
+    the memory of `memory_sessions` sessions held at once in a fresh worker process.
+
+    :param cpus: int, pin the worker processes to this many cores (default is 1, None disables pinning, Linux only)
+    :param memory_sessions: int, the number of sessions kept alive to measure the memory per session (0 skips it)
+    :return: tuple, (list of session results, list of error messages, elapsed seconds, memory per session in bytes or None)
+    """
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=int(365 * years))
+
+    results, errors = [], []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker, initargs=(cpus,)) as executor:
+        futures = [executor.submit(run_session, session_id, start_date, end_date, windows, timeout) for session_id in range(sessions)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(str(e))
+    elapsed = time.perf_counter() - started
+
+    session_memory = None
+    if memory_sessions:
+        with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(cpus,)) as executor:
+            try:
+                session_memory = executor.submit(measure_session_memory, memory_sessions, start_date, end_date, windows, timeout).result()
+            except Exception as e:
+                errors.append(f"Memory measurement: {e}")
+    return results, errors, elapsed, session_memory
+
+
+def print_report(results, errors, elapsed, concurrency, session_memory, memory_sessions):
+    """
+    Prints latency percentiles per view, throughput and memory per session.
+    """
+    print(f"Sessions: {len(results)} completed, {len(errors)} failed, {concurrency} concurrent, {elapsed:.1f}s")
+    for error in sorted(set(errors)):
+        print(f"  Error: {error}")
+    if not results:
+        return
+
+    print(f"\n{'View':<18}{'p50 (s)':>10}{'p90 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}{'max (s)':>10}")
+    for step in STEPS + ["Session"]:
+        if step == "Session":
+            values = [sum(result["timings"].values()) for result in results]
+        else:
+            values = [result["timings"][step] for result in results]
+        p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+        print(f"{step:<18}{p50:>10.3f}{p90:>10.3f}{p95:>10.3f}{p99:>10.3f}{max(values):>10.3f}")
+
+    total_runs = sum(result["runs"] for result in results)
+    frame_bytes = [result["frame_bytes"] / 2**20 for result in results]
+    peak_rss = max(result["peak_rss"] for result in results) / 2**20
+
+    print(f"\nThroughput: {len(results) / elapsed:.2f} sessions/s, {total_runs / elapsed:.2f} script runs/s")
+    if session_memory is not None:
+        print(f"Memory per session (RSS growth over {memory_sessions} sessions held at once): {session_memory / 2**20:.2f} MiB")
+    print(f"DataFrame bytes in session state: {np.mean(frame_bytes):.2f} MiB mean, {max(frame_bytes):.2f} MiB max")
+    print(f"Peak worker process RSS: {peak_rss:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the stock app with concurrent sessions on synthetic data.")
+    parser.add_argument("--sessions", type=int, default=20, help="Total number of sessions to run.")
+    parser.add_argument("--concurrency", type=int, default=5, help="Number of sessions running at the same time.")
+    parser.add_argument("--years", type=float, default=3, help="Years of daily history per session.")
+    parser.add_argument("--windows", type=int, nargs="+", default=[5, 20], help="SMA windows to create (from the SMAs view).")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed for one script run.")
+    parser.add_argument("--memory-sessions", type=int, default=10, help="Sessions kept alive at once to measure the memory per session, 0 skips it.")
+    parser.add_argument("--cpus", type=int, default=1, help="Pin all sessions to this many cores, 0 disables pinning (Linux only).")
+    args = parser.parse_args()
+
+    results, errors, elapsed, session_memory = run_load_test(
+        args.sessions, args.concurrency, args.years, args.windows, args.timeout, args.cpus, args.memory_sessions
+    )
+    print_report(results, errors, elapsed, args.concurrency, session_memory, args.memory_sessions)
+
+
+if __name__ == "__main__":
+    # AppTest replaces __main__ with app.py in the workers, so the workers must find
+    # run_session through this module's name instead
+    import load_test
+    load_test.main()
@@ -1,9 +1,19 @@
+import itertools
+import math
+import random
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
 import pandas as pd
 import yfinance as yf
-from datetime import datetime
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+
 def company_info(ticker):
     company = yf.Ticker(ticker)
     return company.info
@@ -391,7 +401,7 @@ def record_trade(trades_df, entry_date, entry_price, exit_date, exit_price, quan
     return trades_df
 
 
-def process_trades(df, trades_df, quantity):
+def process_trades(df, trades_df, quantity, progress=None, cancel_event=None, job_id=None, report_every=250):
     """
     Iterates over a DataFrame to find entry and exit signals, recording trades accordingly.
     
@@ -399,6 +409,8 @@ def process_trades(df, trades_df, quantity):
     - df: The DataFrame containing 'Entry_Signal' and 'Exit_Signal'.
     - trades_df: The DataFrame where trades are recorded.
     - quantity: The number of units traded for each trade.
+    - progress, cancel_event, job_id: Optional hooks set when running as a background job (see submit_job).
+    - report_every: How many rows to process between progress reports.
     
     Returns:
     - trades_df: The updated DataFrame with all trades recorded.
@@ -406,8 +418,12 @@ def process_trades(df, trades_df, quantity):
     in_trade = False
     entry_date = None
     entry_price = None
+    total_rows = len(df)
     
-    for index, row in df.iterrows():
+    for position, (index, row) in enumerate(df.iterrows()):
+        if position % report_every == 0:
+            report_progress(progress, job_id, position / total_rows, cancel_event)
+
         # Check for entry signal: it should be True, and exit signal should be False
         if not in_trade and row['Entry_Signal'] and not row['Exit_Signal']:
             entry_date = row.name
@@ -420,6 +436,7 @@ def process_trades(df, trades_df, quantity):
             trades_df = record_trade(trades_df, entry_date, entry_price, exit_date, exit_price, quantity)
             in_trade = False
     
+    report_progress(progress, job_id, 1.0)
     return trades_df
 
 def analyze_strategy(trades_df):
@@ -458,4 +475,622 @@ def analyze_strategy(trades_df):
         'Total Sale Price': total_sale_price
     }
     
-    return metrics
\ No newline at end of file
+    return metrics
+
+def _column_values(df, column):
+    """
+    Returns the values of a DataFrame column, or of the index when `column` is the index name.
+
+    :param df: pd.DataFrame, the DataFrame to read from
+    :param column: str, a column name or the index name ('index' when the index is unnamed)
+    :return: pd.Series, the values with a positional (0..n-1) index
+    """
+    if column in df.columns:
+        values = df[column]
+    elif column == (df.index.name or 'index'):
+        values = df.index.to_series()
+    else:
+        raise ValueError(f"Column '{column}' not found in DataFrame.")
+    return values.reset_index(drop=True)
+
+def filter_sort_positions(df, sort_by=None, ascending=True, filter_column=None, filter_value=None):
+    """
+    Computes the row positions of a filtered and sorted view of the DataFrame without copying it.
+
+    The filter is a case-insensitive substring match on the text representation of `filter_column`.
+
+    :param df: pd.DataFrame, the DataFrame to view
+    :param sort_by: str, the column (or index name) to sort on, None keeps the original order
+    :param ascending: bool, sort direction
+    :param filter_column: str, the column (or index name) to filter on, None disables filtering
+    :param filter_value: str, the text to look for in `filter_column`
+    :return: np.ndarray, row positions of the view in display order
+    """
+    positions = np.arange(len(df))
+
+    if filter_column and filter_value:
+        values = _column_values(df, filter_column).astype(str)
+        mask = values.str.contains(str(filter_value), case=False, regex=False).to_numpy()
+        positions = positions[mask]
+
+    if sort_by:
+        values = _column_values(df, sort_by).iloc[positions]
+        positions = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+    return positions
+
+def paginate_dataframe(df, positions=None, page=1, page_size=50):
+    """
+    Returns only the requested page of rows so that large DataFrames are never sent to the browser whole.
+
+    :param df: pd.DataFrame, the full DataFrame
+    :param positions: np.ndarray, row positions from filter_sort_positions (default is all rows in order)
+    :param page: int, the 1-based page number, clamped to the available pages
+    :param page_size: int, the number of rows per page
+    :return: tuple, (page DataFrame, total number of pages, the page actually returned)
+    """
+    if positions is None:
+        positions = np.arange(len(df))
+
+    total_pages = max(1, math.ceil(len(positions) / page_size))
+    page = min(max(1, int(page)), total_pages)
+    start = (page - 1) * page_size
+
+    return df.iloc[positions[start:start + page_size]], total_pages, page
+
+class JobCancelled(Exception):
+    """Raised inside a background job when the user has cancelled it."""
+
+def report_progress(progress, job_id, fraction, cancel_event=None):
+    """
+    Publishes the progress of a background job and stops it if it has been cancelled.
+
+    Does nothing when the work is not running as a background job (progress is None).
+
+    :param progress: shared dict (multiprocessing Manager) mapping job ids to completion fractions
+    :param job_id: str, the id of the running job
+    :param fraction: float, completion between 0 and 1
+    :param cancel_event: shared Event set when the user cancels the job
+    """
+    if progress is not None:
+        progress[job_id] = fraction
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled(f"Job {job_id} was cancelled.")
+
+def submit_job(jobs, executor, manager, progress, name, fn, *args, max_running=2, **kwargs):
+    """
+    Runs fn(*args, **kwargs) in a process pool and records it in `jobs` under a new job id.
+
+    fn must be importable (defined in a module, not in app.py) and accept the progress,
+    cancel_event and job_id keyword arguments, which it should pass to report_progress.
+
+    :param jobs: dict, the user's jobs keyed by job id (kept in the session state)
+    :param executor: concurrent.futures.ProcessPoolExecutor shared by all users
+    :param manager: multiprocessing Manager used to create the cancel event
+    :param progress: shared dict where jobs report their progress
+    :param name: str, a label for the job shown in the UI
+    :param fn: callable, the work to run
+    :param max_running: int, the maximum number of unfinished jobs per user
+    :return: str, the id of the new job
+    """
+    running = sum(1 for job in jobs.values() if not job['future'].done())
+    if running >= max_running:
+        raise ValueError(f"Only {max_running} jobs can run at the same time. Wait for one to finish or cancel it.")
+
+    job_id = uuid.uuid4().hex
+    cancel_event = manager.Event()
+    future = executor.submit(fn, *args, progress=progress, cancel_event=cancel_event, job_id=job_id, **kwargs)
+
+    jobs[job_id] = {
+        'name': name,
+        'future': future,
+        'cancel_event': cancel_event,
+        'submitted': datetime.now(),
+        'handed_off': False
+    }
+    return job_id
+
+def job_status(job, progress, job_id):
+    """
+    Returns the state of a job: 'queued', 'running', 'cancelled', 'failed' or 'done'.
+
+    :param job: dict, the job record created by submit_job
+    :param progress: shared dict where jobs report their progress
+    :param job_id: str, the id of the job
+    :return: tuple, (state, completion fraction between 0 and 1)
+    """
+    future = job['future']
+    fraction = progress.get(job_id, 0.0)
+
+    if future.cancelled():
+        return 'cancelled', fraction
+    if not future.done():
+        return ('running' if future.running() else 'queued'), fraction
+    if isinstance(future.exception(), JobCancelled):
+        return 'cancelled', fraction
+    if future.exception() is not None:
+        return 'failed', fraction
+    return 'done', 1.0
+
+def cancel_job(job):
+    """
+    Cancels a job: a queued job is dropped, a running job stops at its next progress report.
+
+    :param job: dict, the job record created by submit_job
+    """
+    if not job['future'].cancel():
+        job['cancel_event'].set()
+
+def download_universe_prices(tickers, start_date, end_date=None, column='Close'):
+    """
+    Downloads one price column for a list of tickers from Yahoo Finance.
+
+    :param tickers: list of str, the ticker symbols
+    :param start_date: str, start date in the format 'YYYY-MM-DD'
+    :param end_date: str, end date in the format 'YYYY-MM-DD' (default is today's date)
+    :param column: str, the price column to keep (default is 'Close')
+    :return: pd.DataFrame, DataFrame with one column per ticker
+    """
+    if end_date is None:
+        end_date = datetime.today().strftime('%Y-%m-%d')
+
+    prices = yf.download(list(tickers), start=start_date, end=end_date)[column]
+    if isinstance(prices, pd.Series):
+        prices = prices.to_frame(tickers[0])
+    return prices
+
+def compute_returns(prices):
+    """
+    Computes daily simple returns, leaving gaps where a ticker has no price.
+
+    :param prices: pd.DataFrame, prices with one column per ticker
+    :return: pd.DataFrame, DataFrame of daily returns without the first (empty) row
+    """
+    return prices.pct_change(fill_method=None).iloc[1:]
+
+def _prepare_returns(returns, window, as_of=None, min_periods=None):
+    """
+    Takes the trailing `window` returns of every ticker, centered, with gaps set to 0, and a mask of the days with data.
+
+    Tickers with fewer than `min_periods` returns in the window, or with no variation, are dropped.
+
+    :return: tuple, (centered values of shape window x tickers, mask of the same shape, kept tickers)
+    """
+    if as_of is not None:
+        returns = returns.loc[:as_of]
+    returns = returns.iloc[-window:]
+    if min_periods is None:
+        min_periods = max(2, window // 2)
+
+    keep = (returns.count() >= min_periods) & (returns.std() > 0)
+    returns = returns.loc[:, keep]
+
+    # Centering only improves the precision of the pairwise sums below, it does not change the results
+    values = (returns - returns.mean()).to_numpy(dtype=np.float64)
+    mask = ~np.isnan(values)
+    return np.where(mask, values, 0.0), mask.astype(np.float64), list(returns.columns)
+
+def _pairwise_correlation_tile(x, x_mask, y, y_mask, min_periods):
+    """
+    Computes the correlations and betas of the x tickers against the y tickers over the days both have data,
+    the same way as DataFrame.corr(). Pairs with fewer than `min_periods` shared days are NaN.
+
+    :return: tuple, (correlations, betas of the x tickers against the y tickers), both of shape x tickers x y tickers
+    """
+    shared_days = x_mask.T @ y_mask
+    sum_x = x.T @ y_mask
+    sum_y = x_mask.T @ y
+    sum_xx = (x * x).T @ y_mask
+    sum_yy = x_mask.T @ (y * y)
+    sum_xy = x.T @ y
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_xy - sum_x * sum_y / shared_days
+        var_x = sum_xx - sum_x ** 2 / shared_days
+        var_y = sum_yy - sum_y ** 2 / shared_days
+        corr = cov / np.sqrt(var_x * var_y)
+        beta = cov / var_y
+
+    invalid = (shared_days < min_periods) | (var_x <= 0) | (var_y <= 0)
+    corr[invalid] = np.nan
+    beta[invalid] = np.nan
+    return corr, beta
+
+def _merge_top_k(best_values, best_positions, best_betas, values, positions, betas, k, largest):
+    """
+    Keeps the k largest (or smallest) values per row out of the current best and a new tile.
+    NaN values (a ticker paired with itself, or too few shared days) are ranked last.
+    """
+    all_values = np.concatenate([best_values, values], axis=1)
+    all_positions = np.concatenate([best_positions, positions], axis=1)
+    all_betas = np.concatenate([best_betas, betas], axis=1)
+
+    # The first tiles can have fewer than k columns
+    k = min(k, all_values.shape[1])
+    order_key = -all_values if largest else all_values
+    order_key = np.where(np.isnan(order_key), np.inf, order_key)
+    keep = np.argpartition(order_key, k - 1, axis=1)[:, :k]
+
+    return (np.take_along_axis(all_values, keep, axis=1), np.take_along_axis(all_positions, keep, axis=1),
+            np.take_along_axis(all_betas, keep, axis=1))
+
+def _screen_row_block(values, mask, start, stop, tile_size, k, min_periods):
+    """
+    Computes the correlations of tickers start..stop against all tickers, one tile at a time,
+    and returns their k most and k least correlated peers with the betas.
+    """
+    n_tickers = values.shape[1]
+    rows = stop - start
+    block, block_mask = values[:, start:stop], mask[:, start:stop]
+
+    empty = (np.full((rows, 0), np.nan), np.full((rows, 0), -1), np.full((rows, 0), np.nan))
+    most, least = empty, empty
+
+    for tile_start in range(0, n_tickers, tile_size):
+        tile_stop = min(tile_start + tile_size, n_tickers)
+        corr, beta = _pairwise_correlation_tile(block, block_mask, values[:, tile_start:tile_stop], mask[:, tile_start:tile_stop], min_periods)
+
+        # Exclude every ticker's correlation with itself
+        for row in range(max(start, tile_start), min(stop, tile_stop)):
+            corr[row - start, row - tile_start] = np.nan
+
+        positions = np.broadcast_to(np.arange(tile_start, tile_stop), corr.shape)
+        most = _merge_top_k(*most, corr, positions, beta, k, largest=True)
+        least = _merge_top_k(*least, corr, positions, beta, k, largest=False)
+
+    return most, least
+
+# Returns and masks shared with the screener worker processes
+_SCREENER_DATA = None
+
+def _init_screener_worker(values, mask):
+    global _SCREENER_DATA
+    _SCREENER_DATA = (values, mask)
+
+def _screen_row_block_worker(start, stop, tile_size, k, min_periods):
+    return _screen_row_block(*_SCREENER_DATA, start, stop, tile_size, k, min_periods)
+
+def correlation_screener(returns, window=60, top_k=10, tile_size=512, as_of=None, min_periods=None, max_workers=None,
+                         progress=None, cancel_event=None, job_id=None):
+    """
+    Finds the most and least correlated peers of every ticker in a universe, together with betas.
+
+    Correlations are taken over the trailing `window` returns ending at `as_of` (the rolling
+    correlation at that date), using for each pair only the days both tickers have data, like
+    DataFrame.corr(). The tickers x tickers matrix is never held in memory: it is computed in tiles
+    of tile_size x tile_size, keeping only the running top_k per ticker, and blocks of rows are
+    spread over a process pool.
+
+    :param returns: pd.DataFrame, daily returns with one column per ticker (see compute_returns)
+    :param window: int, the number of returns in the rolling window
+    :param top_k: int, the number of most and least correlated peers to keep per ticker
+    :param tile_size: int, the number of tickers per tile
+    :param as_of: date, the last date of the window (default is the last row)
+    :param min_periods: int, the minimum number of returns a ticker, and a pair of tickers, needs in the window (default is window // 2)
+    :param max_workers: int, the number of processes (default is the number of cores, 1 runs in-process)
+    :param progress, cancel_event, job_id: Optional hooks set when running as a background job (see submit_job)
+    :return: pd.DataFrame, one row per (Symbol, Direction, Rank) with the Peer, Correlation and Beta
+    """
+    if min_periods is None:
+        min_periods = max(2, window // 2)
+    values, mask, tickers = _prepare_returns(returns, window, as_of, min_periods)
+    n_tickers = len(tickers)
+    if n_tickers < 2:
+        raise ValueError("At least 2 tickers with enough data in the window are needed.")
+    k = min(top_k, n_tickers - 1)
+
+    blocks = [(start, min(start + tile_size, n_tickers)) for start in range(0, n_tickers, tile_size)]
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(blocks))
+
+    results = []
+    if max_workers <= 1:
+        for start, stop in blocks:
+            report_progress(progress, job_id, len(results) / len(blocks), cancel_event)
+            results.append(_screen_row_block(values, mask, start, stop, tile_size, k, min_periods))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_screener_worker, initargs=(values, mask)) as executor:
+            starts, stops = zip(*blocks)
+            for result in executor.map(_screen_row_block_worker, starts, stops, [tile_size] * len(blocks), [k] * len(blocks), [min_periods] * len(blocks)):
+                results.append(result)
+                try:
+                    report_progress(progress, job_id, len(results) / len(blocks), cancel_event)
+                except JobCancelled:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+    frames = []
+    for direction, parts in (('most', [result[0] for result in results]), ('least', [result[1] for result in results])):
+        correlations, positions, betas = (np.concatenate(arrays) for arrays in zip(*parts))
+
+        # Sort each ticker's peers from most to least extreme, NaN pairs last
+        order_key = -correlations if direction == 'most' else correlations
+        order = np.argsort(np.where(np.isnan(order_key), np.inf, order_key), axis=1, kind='stable')
+        correlations = np.take_along_axis(correlations, order, axis=1)
+        positions = np.take_along_axis(positions, order, axis=1)
+        betas = np.take_along_axis(betas, order, axis=1)
+
+        frame = pd.DataFrame({
+            'Symbol': np.asarray(tickers, dtype=object)[np.repeat(np.arange(n_tickers), k)],
+            'Direction': direction,
+            'Rank': np.tile(np.arange(1, k + 1), n_tickers),
+            'Peer': np.asarray(tickers, dtype=object)[positions.ravel()],
+            'Correlation': correlations.ravel(),
+            # Beta of the symbol's returns against the peer's returns
+            'Beta': betas.ravel()
+        })
+        # Pairs without enough shared days are not results
+        frames.append(frame[frame['Correlation'].notna()])
+
+    return pd.concat(frames, ignore_index=True).sort_values(['Symbol', 'Direction', 'Rank'], ignore_index=True)
+
+def screen_universe(tickers, start_date, end_date=None, window=60, top_k=10, progress=None, cancel_event=None, job_id=None):
+    """
+    Downloads the prices of a list of tickers and runs correlation_screener on their daily returns.
+
+    :param tickers: list of str, the ticker symbols
+    :param start_date: str, start date in the format 'YYYY-MM-DD'
+    :param end_date: str, end date in the format 'YYYY-MM-DD' (default is today's date)
+    :param window: int, the number of returns in the rolling window
+    :param top_k: int, the number of most and least correlated peers to keep per ticker
+    :param progress, cancel_event, job_id: Optional hooks set when running as a background job (see submit_job)
+    :return: pd.DataFrame, the output of correlation_screener
+    """
+    report_progress(progress, job_id, 0.0, cancel_event)
+    prices = download_universe_prices(tickers, start_date, end_date)
+    returns = compute_returns(prices)
+    return correlation_screener(returns, window=window, top_k=top_k, progress=progress, cancel_event=cancel_event, job_id=job_id)
+
+def top_correlated(screener_results, symbol, direction='most', top_k=None):
+    """
+    Returns the most or least correlated peers of one symbol from correlation_screener results.
+
+    :param screener_results: pd.DataFrame, the output of correlation_screener
+    :param symbol: str, the ticker to look up
+    :param direction: str, 'most' or 'least'
+    :param top_k: int, the number of peers to return (default is all that were kept)
+    :return: pd.DataFrame, the peers ordered by rank
+    """
+    if direction not in ('most', 'least'):
+        raise ValueError("Direction must be either 'most' or 'least'.")
+
+    peers = screener_results[(screener_results['Symbol'] == symbol) & (screener_results['Direction'] == direction)]
+    peers = peers.sort_values('Rank')
+    if top_k is not None:
+        peers = peers.head(top_k)
+    return peers.reset_index(drop=True)
+
+def strategy_candidates(windows, conditions=('greater than', 'less than')):
+    """
+    Lists every entry/exit strategy that can be built from the Close price and the SMAs of `windows`.
+
+    Each pair of columns is used once per condition, since 'A greater than B' is the same as 'B less than A'.
+
+    :param windows: list of int, the SMA window lengths
+    :param conditions: tuple of str, the conditions to combine the columns with
+    :return: list of dict, strategies with the arguments of generate_signal for entry and exit
+    """
+    columns = ['Close'] + [f'SMA_{window}' for window in windows]
+    rules = [(sma1, condition, sma2) for sma1, sma2 in itertools.combinations(columns, 2) for condition in conditions]
+
+    return [
+        {
+            'entry_sma1': entry[0], 'entry_condition': entry[1], 'entry_sma2': entry[2],
+            'exit_sma1': exit[0], 'exit_condition': exit[1], 'exit_sma2': exit[2]
+        }
+        for entry, exit in itertools.product(rules, rules)
+    ]
+
+def evaluate_strategy(df, candidate, quantity=1, metric='Total Profit/Loss (%)'):
+    """
+    Backtests one strategy on a DataFrame that already has the SMA columns and returns its score.
+
+    :param df: pd.DataFrame, DataFrame with the 'Close' and SMA columns
+    :param candidate: dict, a strategy as returned by strategy_candidates
+    :param quantity: int, the number of units traded for each trade
+    :param metric: str, the analyze_strategy metric used as the score
+    :return: float, the score, or -inf when the strategy makes no trades
+    """
+    signals = pd.DataFrame({
+        'Close': df['Close'],
+        'Entry_Signal': generate_signal(df, candidate['entry_sma1'], candidate['entry_condition'], candidate['entry_sma2']),
+        'Exit_Signal': generate_signal(df, candidate['exit_sma1'], candidate['exit_condition'], candidate['exit_sma2'])
+    })
+    trades_df = process_trades(signals, pd.DataFrame(), quantity)
+    if len(trades_df) == 0:
+        return -math.inf
+    return float(analyze_strategy(trades_df)[metric])
+
+def successive_halving_search(data, windows, candidates=None, eta=3, min_fraction=1/9, max_candidates=None, seed=None,
+                              quantity=1, metric='Total Profit/Loss (%)', progress=None, cancel_event=None, job_id=None):
+    """
+    Searches for the best SMA strategy with successive halving instead of backtesting every candidate on the full history.
+
+    All candidates are first scored on the most recent `min_fraction` of the history. Only the best
+    1/eta of them are promoted to a slice eta times longer, and so on, until the last rung uses the
+    full history.
+
+    :param data: pd.DataFrame, the stock data with a 'Close' column
+    :param windows: list of int, the SMA window lengths to build strategies from
+    :param candidates: list of dict, the strategies to search (default is strategy_candidates(windows))
+    :param eta: int, the promotion rate: 1/eta of the candidates survive each rung
+    :param min_fraction: float, the fraction of the history used by the first rung
+    :param max_candidates: int, randomly sample this many candidates (default is all of them)
+    :param seed: int, seed for the sampling
+    :param quantity: int, the number of units traded for each trade
+    :param metric: str, the analyze_strategy metric to maximize
+    :param progress, cancel_event, job_id: Optional hooks set when running as a background job (see submit_job)
+    :return: dict, the best strategy, a leaderboard of the final rung and counts of the evaluations saved
+    """
+    if eta < 2:
+        raise ValueError("eta must be at least 2.")
+    if not (0 < min_fraction <= 1):
+        raise ValueError("min_fraction must be between 0 and 1.")
+
+    sma_df = create_moving_averages(data[['Close']].copy(), windows=windows)
+    total_rows = len(sma_df)
+
+    if candidates is None:
+        candidates = strategy_candidates(windows)
+    if max_candidates is not None and max_candidates < len(candidates):
+        candidates = random.Random(seed).sample(candidates, max_candidates)
+
+    # Plan the rungs: the history fraction grows by eta until it reaches the full history
+    fractions = []
+    fraction = min_fraction
+    # The tolerance keeps rounding (e.g. 1/9 * 3 * 3) from adding a rung just short of the full history
+    while fraction < 1 - 1e-9:
+        fractions.append(fraction)
+        fraction *= eta
+    fractions.append(1.0)
+
+    survivors_per_rung = [len(candidates)]
+    for _ in fractions[1:]:
+        survivors_per_rung.append(max(1, math.ceil(survivors_per_rung[-1] / eta)))
+    planned_rows = sum(count * math.ceil(fraction * total_rows) for count, fraction in zip(survivors_per_rung, fractions))
+
+    survivors = list(candidates)
+    rows_evaluated = 0
+    evaluations = 0
+
+    for rung, (fraction, count) in enumerate(zip(fractions, survivors_per_rung)):
+        history = sma_df.iloc[-math.ceil(fraction * total_rows):]
+        survivors = survivors[:count]
+
+        scores = []
+        for candidate in survivors:
+            report_progress(progress, job_id, rows_evaluated / planned_rows, cancel_event)
+            scores.append(evaluate_strategy(history, candidate, quantity, metric))
+            rows_evaluated += len(history)
+            evaluations += 1
+
+        # Best candidates first, so the next rung keeps the head of the list
+        ranking = sorted(range(len(survivors)), key=lambda position: scores[position], reverse=True)
+        survivors = [survivors[position] for position in ranking]
+        scores = [scores[position] for position in ranking]
+
+    report_progress(progress, job_id, 1.0)
+
+    leaderboard = pd.DataFrame(survivors)
+    leaderboard[metric] = scores
+    full_backtests = len(survivors)
+    brute_force_rows = len(candidates) * total_rows
+
+    return {
+        'Best Strategy': survivors[0],
+        'Best Score': scores[0],
+        'Metric': metric,
+        'Leaderboard': leaderboard,
+        'Candidates': len(candidates),
+        'Rungs': len(fractions),
+        'Evaluations': evaluations,
+        'Full-History Backtests': full_backtests,
+        'Full-History Backtests Saved': len(candidates) - full_backtests,
+        'Rows Evaluated': rows_evaluated,
+        'Brute-Force Rows': brute_force_rows,
+        'Compute Saved (%)': 100 * (1 - rows_evaluated / brute_force_rows)
+    }
+
+def _iter_chunks(df, positions=None, chunk_size=100_000):
+    """
+    Yields consecutive row chunks of the DataFrame (or of the rows at `positions`) without copying the whole frame.
+    """
+    if positions is None:
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        for start in range(0, len(positions), chunk_size):
+            yield df.iloc[positions[start:start + chunk_size]]
+
+def iter_csv_chunks(df, positions=None, chunk_size=100_000):
+    """
+    Yields the DataFrame as CSV text one chunk at a time, with the header in the first chunk only.
+
+    :param df: pd.DataFrame, the DataFrame to export
+    :param positions: np.ndarray, row positions to export, e.g. from filter_sort_positions (default is all rows)
+    :param chunk_size: int, the number of rows per chunk
+    :return: generator of str
+    """
+    header = True
+    for chunk in _iter_chunks(df, positions, chunk_size):
+        yield chunk.to_csv(header=header)
+        header = False
+    if header:
+        yield df.iloc[:0].to_csv()
+
+def _open_columnar_writer(sink, schema, file_format, compression):
+    """
+    Opens a Parquet or Arrow IPC file writer with the default codec of the format when none is given.
+    """
+    if file_format == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression=compression or 'zstd')
+    options = pa.ipc.IpcWriteOptions(compression=compression or 'lz4')
+    return pa.ipc.new_file(sink, schema, options=options)
+
+def _export_schema(df, sample_size=1000, chunk_size=100_000):
+    """
+    Infers the Arrow schema of a DataFrame (with its index) without converting whole columns.
+
+    Object columns have no Arrow type on an empty frame, so theirs is taken from the first
+    `sample_size` non-null values. Columns without any value keep the null type.
+    """
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=True)
+
+    # Fields are the columns in order, followed by the index levels
+    n_columns = len(df.columns)
+    for position, field in enumerate(schema):
+        if not pa.types.is_null(field.type):
+            continue
+        if position < n_columns:
+            values = df.iloc[:, position]
+        else:
+            values = pd.Series(df.index.get_level_values(position - n_columns))
+
+        sample = []
+        for start in range(0, len(values), chunk_size):
+            sample.extend(values.iloc[start:start + chunk_size].dropna().iloc[:sample_size - len(sample)])
+            if len(sample) >= sample_size:
+                break
+        if sample:
+            schema = schema.set(position, field.with_type(pa.array(sample, from_pandas=True).type))
+
+    return schema
+
+def export_dataframe(df, sink, file_format='parquet', positions=None, chunk_size=100_000, compression=None):
+    """
+    Writes a DataFrame (e.g. the price/SMA/signal frame or trades_df) to Parquet, Arrow IPC or CSV in chunks,
+    so writing to a file keeps memory use flat however many rows are exported.
+
+    :param df: pd.DataFrame, the DataFrame to export, the index is kept
+    :param sink: str or binary file object, where to write
+    :param file_format: str, 'parquet', 'arrow' or 'csv'
+    :param positions: np.ndarray, row positions to export, e.g. from filter_sort_positions (default is all rows)
+    :param chunk_size: int, the number of rows per chunk (and per Parquet row group or Arrow record batch)
+    :param compression: str, codec to use (default is 'zstd' for Parquet, 'lz4' for Arrow, none for CSV)
+    """
+    if file_format not in ('parquet', 'arrow', 'csv'):
+        raise ValueError("File format must be 'parquet', 'arrow' or 'csv'.")
+
+    if file_format == 'csv':
+        close = isinstance(sink, str)
+        output = open(sink, 'wb') if close else sink
+        try:
+            for text in iter_csv_chunks(df, positions, chunk_size):
+                output.write(text.encode('utf-8'))
+        finally:
+            if close:
+                output.close()
+        return
+
+    # A column can be all null in the first chunks, so the schema is not taken from the first chunk
+    schema = _export_schema(df, chunk_size=chunk_size)
+    writer = _open_columnar_writer(sink, schema, file_format, compression)
+    try:
+        for chunk in _iter_chunks(df, positions, chunk_size):
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=True)
+            if file_format == 'parquet':
+                writer.write_table(table, row_group_size=chunk_size)
+            else:
+                writer.write_table(table, max_chunksize=chunk_size)
+    finally:
+        writer.close()
@@ -0,0 +1,282 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import my_tools as mt
+
+
+def gapped_returns(n_tickers=40, n_days=120, window=60, gapped_tickers=10, missing_days=20, seed=1):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (n_days, 3)) @ rng.normal(0, 1, (3, n_tickers))
+    returns = pd.DataFrame(factors + rng.normal(0, 0.01, (n_days, n_tickers)), columns=[f'T{i}' for i in range(n_tickers)])
+    for column in range(gapped_tickers):
+        returns.iloc[n_days - window + rng.choice(window, missing_days, replace=False), column] = np.nan
+    return returns
+
+
+@pytest.mark.parametrize('top_k, tile_size, max_workers', [(5, 16, 1), (20, 8, 1), (5, 16, 2)])
+def test_correlation_screener_matches_pairwise_corr_with_gaps(top_k, tile_size, max_workers):
+    window = 60
+    returns = gapped_returns(window=window)
+    results = mt.correlation_screener(returns, window=window, top_k=top_k, tile_size=tile_size, max_workers=max_workers)
+
+    trailing = returns.iloc[-window:]
+    expected = trailing.corr(min_periods=window // 2)
+    for symbol in returns.columns:
+        peers = expected[symbol].drop(symbol).dropna()
+        for direction, ascending in (('most', False), ('least', True)):
+            got = mt.top_correlated(results, symbol, direction)
+            want = peers.sort_values(ascending=ascending).head(top_k)
+            np.testing.assert_allclose(got['Correlation'], want.to_numpy())
+
+            # Beta of the symbol against its first peer over the days both have data
+            pair = trailing[[symbol, got['Peer'][0]]].dropna()
+            beta = pair.cov().iloc[0, 1] / pair.iloc[:, 1].var()
+            assert got['Beta'][0] == pytest.approx(beta)
+
+
+def test_export_dataframe_with_null_first_chunk(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    df = pd.DataFrame({'Note': [None] * 5 + ['x'] * 5, 'Close': np.arange(10.0)})
+
+    mt.export_dataframe(df, str(tmp_path / 'out.parquet'), 'parquet', chunk_size=5)
+    mt.export_dataframe(df, str(tmp_path / 'out.arrow'), 'arrow', chunk_size=5)
+
+    assert pd.read_parquet(tmp_path / 'out.parquet').equals(df)
+    assert pa.ipc.open_file(str(tmp_path / 'out.arrow')).read_pandas().equals(df)
+
+
+def price_frame(index_name='Date'):
+    index = pd.date_range('2023-01-02', periods=5, name=index_name)
+    return pd.DataFrame({'Close': [3.0, np.nan, 1.0, 5.0, 2.0], 'Ticker': ['a', 'Bb', 'b', 'c', 'B']}, index=index)
+
+
+@pytest.mark.parametrize('index_name, filter_column', [('Date', 'Date'), (None, 'index')])
+def test_filter_sort_positions_filters_on_index(index_name, filter_column):
+    df = price_frame(index_name)
+    positions = mt.filter_sort_positions(df, filter_column=filter_column, filter_value='2023-01-04')
+    assert positions.tolist() == [2]
+
+
+def test_filter_sort_positions_sorts_descending_with_nan_last():
+    positions = mt.filter_sort_positions(price_frame(), sort_by='Close', ascending=False)
+    assert positions.tolist() == [3, 0, 4, 2, 1]
+
+
+def test_filter_sort_positions_filters_then_sorts():
+    # Case-insensitive match on 'b' keeps rows 1, 2 and 4, then sorts them by Close
+    positions = mt.filter_sort_positions(price_frame(), sort_by='Close', filter_column='Ticker', filter_value='b')
+    assert positions.tolist() == [2, 4, 1]
+
+
+def test_paginate_dataframe_clamps_page_past_the_end():
+    df = price_frame()
+    page_df, total_pages, page = mt.paginate_dataframe(df, page=10, page_size=2)
+    assert (total_pages, page) == (3, 3)
+    assert page_df.index.equals(df.index[4:])
+
+
+def test_paginate_dataframe_with_no_positions():
+    page_df, total_pages, page = mt.paginate_dataframe(price_frame(), np.array([], dtype=int), page=2, page_size=2)
+    assert page_df.empty
+    assert (total_pages, page) == (1, 1)
+
+
+@pytest.fixture(scope='module')
+def job_resources():
+    manager = multiprocessing.Manager()
+    executor = ProcessPoolExecutor(max_workers=1)
+    yield executor, manager, manager.dict()
+    executor.shutdown(wait=True, cancel_futures=True)
+    manager.shutdown()
+
+
+def signal_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Close': rng.uniform(50, 150, n_rows),
+        'Entry_Signal': rng.random(n_rows) > 0.5,
+        'Exit_Signal': rng.random(n_rows) > 0.5
+    }, index=pd.date_range('2000-01-01', periods=n_rows, freq='min', name='Date'))
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.05)
+
+
+def test_background_backtest_matches_process_trades(job_resources):
+    executor, manager, progress = job_resources
+    df, jobs = signal_frame(300), {}
+
+    job_id = mt.submit_job(jobs, executor, manager, progress, 'backtest', mt.process_trades, df, pd.DataFrame(), 1)
+    wait([jobs[job_id]['future']], timeout=30)
+
+    assert mt.job_status(jobs[job_id], progress, job_id) == ('done', 1.0)
+    pd.testing.assert_frame_equal(jobs[job_id]['future'].result(), mt.process_trades(df, pd.DataFrame(), 1))
+
+
+def test_running_job_reports_progress_and_can_be_cancelled(job_resources):
+    executor, manager, progress = job_resources
+    jobs = {}
+
+    job_id = mt.submit_job(jobs, executor, manager, progress, 'slow', mt.process_trades, signal_frame(200_000), pd.DataFrame(), 1, report_every=100)
+    wait_for(lambda: progress.get(job_id, 0) > 0)
+    assert mt.job_status(jobs[job_id], progress, job_id)[0] == 'running'
+
+    mt.cancel_job(jobs[job_id])
+    wait([jobs[job_id]['future']], timeout=30)
+
+    # The worker stops at its next progress report by raising JobCancelled
+    assert isinstance(jobs[job_id]['future'].exception(), mt.JobCancelled)
+    status, fraction = mt.job_status(jobs[job_id], progress, job_id)
+    assert status == 'cancelled' and 0 < fraction < 1
+
+
+def test_submit_job_enforces_the_limit(job_resources):
+    executor, manager, progress = job_resources
+    jobs = {}
+
+    job_ids = [mt.submit_job(jobs, executor, manager, progress, 'slow', mt.process_trades, signal_frame(200_000), pd.DataFrame(), 1) for _ in range(2)]
+    try:
+        with pytest.raises(ValueError):
+            mt.submit_job(jobs, executor, manager, progress, 'third', mt.process_trades, signal_frame(10), pd.DataFrame(), 1)
+    finally:
+        for job_id in job_ids:
+            mt.cancel_job(jobs[job_id])
+        wait([job['future'] for job in jobs.values()], timeout=30)
+
+    assert all(mt.job_status(jobs[job_id], progress, job_id)[0] == 'cancelled' for job_id in job_ids)
+
+
+def test_queued_job_is_dropped(job_resources):
+    executor, manager, progress = job_resources
+    jobs = {}
+
+    # The single worker is busy and the executor already holds the next call, so the last job waits
+    job_ids = [mt.submit_job(jobs, executor, manager, progress, 'slow', mt.process_trades, signal_frame(200_000), pd.DataFrame(), 1, max_running=4) for _ in range(4)]
+    try:
+        assert mt.job_status(jobs[job_ids[-1]], progress, job_ids[-1])[0] == 'queued'
+        mt.cancel_job(jobs[job_ids[-1]])
+        assert jobs[job_ids[-1]]['future'].cancelled()
+        assert mt.job_status(jobs[job_ids[-1]], progress, job_ids[-1])[0] == 'cancelled'
+    finally:
+        for job_id in job_ids:
+            mt.cancel_job(jobs[job_id])
+        wait([job['future'] for job in jobs.values()], timeout=30)
+
+
+def test_failed_job(job_resources):
+    executor, manager, progress = job_resources
+    jobs = {}
+
+    job_id = mt.submit_job(jobs, executor, manager, progress, 'broken', mt.process_trades, pd.DataFrame({'Close': [1.0]}), pd.DataFrame(), 1)
+    wait([jobs[job_id]['future']], timeout=30)
+
+    assert mt.job_status(jobs[job_id], progress, job_id)[0] == 'failed'
+    assert isinstance(jobs[job_id]['future'].exception(), KeyError)
+
+
+def test_correlation_screener_as_background_job(job_resources):
+    executor, manager, progress = job_resources
+    returns, jobs = gapped_returns(), {}
+
+    # The screener starts its own process pool inside the job's worker
+    job_id = mt.submit_job(jobs, executor, manager, progress, 'screen', mt.correlation_screener, returns, top_k=5, tile_size=16, max_workers=2)
+    wait([jobs[job_id]['future']], timeout=60)
+
+    assert mt.job_status(jobs[job_id], progress, job_id) == ('done', 1.0)
+    pd.testing.assert_frame_equal(jobs[job_id]['future'].result(), mt.correlation_screener(returns, top_k=5, tile_size=16, max_workers=1))
+
+
+def close_frame(n_rows=400, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    return pd.DataFrame({'Close': close}, index=pd.date_range('2020-01-01', periods=n_rows, name='Date'))
+
+
+def test_strategy_candidates():
+    candidates = mt.strategy_candidates([5, 20])
+    # 3 columns give 3 pairs x 2 conditions = 6 rules, for entry and for exit
+    assert len(candidates) == 36
+    assert len({tuple(candidate.values()) for candidate in candidates}) == 36
+    assert all(candidate['entry_sma1'] != candidate['entry_sma2'] and candidate['exit_sma1'] != candidate['exit_sma2'] for candidate in candidates)
+
+
+def test_evaluate_strategy_without_trades_scores_minus_infinity():
+    never = {'entry_sma1': 'Close', 'entry_condition': 'greater than', 'entry_sma2': 'Close',
+             'exit_sma1': 'Close', 'exit_condition': 'less than', 'exit_sma2': 'Close'}
+    assert mt.evaluate_strategy(close_frame(), never) == -np.inf
+
+
+@pytest.mark.parametrize('eta, min_fraction, fractions, survivors', [
+    (3, 1/9, [1/9, 1/3, 1], [60, 20, 7]),
+    (2, 1/4, [1/4, 1/2, 1], [60, 30, 15]),
+    (4, 1/9, [1/9, 4/9, 1], [60, 15, 4]),
+    (3, 1/27, [1/27, 1/9, 1/3, 1], [60, 20, 7, 3]),
+    (3, 1, [1], [60]),
+])
+def test_successive_halving_search_rungs_and_accounting(eta, min_fraction, fractions, survivors):
+    data = close_frame()
+    n_rows = len(data)
+    results = mt.successive_halving_search(data, [5, 10, 20], eta=eta, min_fraction=min_fraction, max_candidates=60, seed=0)
+
+    rows_evaluated = sum(count * int(np.ceil(fraction * n_rows)) for count, fraction in zip(survivors, fractions))
+    assert results['Candidates'] == 60
+    assert results['Rungs'] == len(fractions)
+    assert results['Evaluations'] == sum(survivors)
+    assert results['Full-History Backtests'] == survivors[-1]
+    assert results['Full-History Backtests Saved'] == 60 - survivors[-1]
+    assert results['Rows Evaluated'] == rows_evaluated
+    assert results['Brute-Force Rows'] == 60 * n_rows
+    assert results['Compute Saved (%)'] == pytest.approx(100 * (1 - rows_evaluated / (60 * n_rows)))
+
+    # The final rung backtests the survivors on the full history, best first
+    leaderboard = results['Leaderboard']
+    assert len(leaderboard) == survivors[-1]
+    scores = leaderboard[results['Metric']].tolist()
+    assert scores == sorted(scores, reverse=True)
+    assert results['Best Score'] == scores[0]
+    assert results['Best Strategy'] == leaderboard.drop(columns=results['Metric']).iloc[0].to_dict()
+
+    sma_df = mt.create_moving_averages(data[['Close']].copy(), windows=[5, 10, 20])
+    for candidate, score in zip(leaderboard.drop(columns=results['Metric']).to_dict(orient='records'), scores):
+        assert mt.evaluate_strategy(sma_df, candidate) == score
+
+
+@pytest.mark.parametrize('kwargs', [{'eta': 1}, {'min_fraction': 0}, {'min_fraction': 1.5}])
+def test_successive_halving_search_rejects_bad_settings(kwargs):
+    with pytest.raises(ValueError):
+        mt.successive_halving_search(close_frame(), [5, 20], **kwargs)
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_export_dataframe_with_string_columns(tmp_path, file_format):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    n_rows = 2500
+    df = pd.DataFrame({
+        'Symbol': [f'T{i % 7}' for i in range(n_rows)],
+        'Direction': np.where(np.arange(n_rows) % 2, 'most', 'least').astype(object),
+        # Null in the first two chunks, and beyond the 1000 values sampled for the type
+        'Peer': [None] * 1200 + [f'P{i}' for i in range(n_rows - 1200)],
+        'Empty': [None] * n_rows,
+        'Correlation': np.linspace(-1, 1, n_rows)
+    }, index=pd.Index([f'row{i}' for i in range(n_rows)], name='Key'))
+
+    path = str(tmp_path / f'out.{file_format}')
+    mt.export_dataframe(df, path, file_format, chunk_size=500)
+
+    if file_format == 'parquet':
+        table = pq.read_table(path)
+    else:
+        table = pa.ipc.open_file(path).read_all()
+    assert table.schema.field('Peer').type == pa.string()
+    assert table.schema.field('Key').type == pa.string()
+    pd.testing.assert_frame_equal(table.to_pandas(), df)